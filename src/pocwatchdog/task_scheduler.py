@@ -1,16 +1,153 @@
+import atexit
 import os
+import queue
 import re
+import sched
+import threading
 import time
 import traceback
-from datetime import datetime
+from datetime import datetime, timedelta
 import smtplib
+from email import encoders
 from email.header import Header
+from email.mime.base import MIMEBase
 from email.mime.image import MIMEImage
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from typing import Callable, Union, List, Dict, Optional
 
-import schedule
+# Upper bound for a single idle sleep in the main loop, in seconds, so the wall clock is
+# rechecked after DST changes, suspend or clock steps
+MAX_SLEEP = 60
+
+# Scheduled jobs, each event runs fire_job(spec, callback, fire_time).
+# Interval jobs run on time.monotonic() times, time of day jobs on time.time() times.
+_SCHED = sched.scheduler(time.monotonic, time.sleep)
+_WALL_SCHED = sched.scheduler(time.time, time.sleep)
+
+# Weekday index as returned by datetime.weekday() (0 is Monday)
+WEEKDAY_INDEX = {
+    "monday": 0,
+    "tuesday": 1,
+    "wednesday": 2,
+    "thursday": 3,
+    "friday": 4,
+    "saturday": 5,
+    "sunday": 6,
+}
+
+# Day of week strings mapped to day names, matched on the whole string
+_WEEKDAY_MAP = {
+    "1": "monday",
+    "mon": "monday",
+    "monday": "monday",
+    "星期一": "monday",
+    "周一": "monday",
+    "礼拜一": "monday",
+    "2": "tuesday",
+    "tue": "tuesday",
+    "tuesday": "tuesday",
+    "星期二": "tuesday",
+    "周二": "tuesday",
+    "礼拜二": "tuesday",
+    "3": "wednesday",
+    "wed": "wednesday",
+    "wednesday": "wednesday",
+    "星期三": "wednesday",
+    "周三": "wednesday",
+    "礼拜三": "wednesday",
+    "4": "thursday",
+    "thu": "thursday",
+    "thursday": "thursday",
+    "星期四": "thursday",
+    "周四": "thursday",
+    "礼拜四": "thursday",
+    "5": "friday",
+    "fri": "friday",
+    "friday": "friday",
+    "星期五": "friday",
+    "周五": "friday",
+    "礼拜五": "friday",
+    "6": "saturday",
+    "sat": "saturday",
+    "saturday": "saturday",
+    "星期六": "saturday",
+    "周六": "saturday",
+    "礼拜六": "saturday",
+    "7": "sunday",
+    "sun": "sunday",
+    "sunday": "sunday",
+    "星期日": "sunday",
+    "星期天": "sunday",
+    "周日": "sunday",
+    "周天": "sunday",
+    "礼拜日": "sunday",
+    "礼拜天": "sunday",
+}
+
+# English abbreviations matched on the first three characters (e.g. "tues", "mon.")
+_WEEKDAY_PREFIXES = {
+    "mon": "monday",
+    "tue": "tuesday",
+    "wed": "wednesday",
+    "thu": "thursday",
+    "fri": "friday",
+    "sat": "saturday",
+    "sun": "sunday",
+}
+
+# First characters of all weekday keys, rejects other strings before any dict lookup
+_WEEKDAY_FIRSTCHARS = frozenset(key[0] for key in _WEEKDAY_MAP)
+
+# Matches Chinese characters in attachment file names
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]')
+
+# Image bytes keyed by path, each entry holds (mtime, size, data)
+_IMG_CACHE = {}
+
+# Current datetime shared by the jobs firing in the same second, see _now_cached()
+_TICK_CACHE = {"t": 0, "dt": None}
+
+# SMTP (server, port) by sender email domain, used when smtp_server or smtp_port is not given
+_SMTP_PROVIDERS = {
+    "qq.com": ("smtp.qq.com", 465),
+    "exmail.qq.com": ("smtp.exmail.qq.com", 465),
+    "163.com": ("smtp.163.com", 465),
+    "126.com": ("smtp.126.com", 465),
+    "yeah.net": ("smtp.yeah.net", 465),
+    "sina.com": ("smtp.sina.com", 465),
+    "sina.cn": ("smtp.sina.cn", 465),
+    "sohu.com": ("smtp.sohu.com", 465),
+    "outlook.com": ("smtp.office365.com", 587),
+    "hotmail.com": ("smtp.office365.com", 587),
+    "live.com": ("smtp.office365.com", 587),
+    "gmail.com": ("smtp.gmail.com", 587),
+    "yahoo.com": ("smtp.mail.yahoo.com", 465),
+    "yahoo.com.cn": ("smtp.mail.yahoo.com.cn", 465),
+    "aliyun.com": ("smtp.aliyun.com", 465),
+    "139.com": ("smtp.139.com", 465),
+    "189.cn": ("smtp.189.cn", 465),
+    "21cn.com": ("smtp.21cn.com", 465),
+}
+
+# Logged-in SMTP connections keyed by (sender, smtp_server, smtp_port, smtp_ssl),
+# each entry holds {server, sent_count, last_used}
+_SMTP_CACHE = {}
+
+# Maximum number of messages sent over a single cached SMTP connection
+MAX_PER_CONN = 1000
+
+# Idle time in seconds after which a cached SMTP connection is reopened
+IDLE_TTL = 100
+
+# Notification emails waiting to be sent by the background SMTP thread
+_SMTP_Q = queue.Queue(maxsize=1024)
+_SMTP_WORKER = None
+_SMTP_WORKER_LOCK = threading.Lock()
+
+# Time in seconds to wait for queued emails to be sent on process shutdown
+SHUTDOWN_TIMEOUT = 30
+
 
 def run(
     job: Callable,
@@ -26,7 +163,7 @@ def run(
     success_file_path: Optional[str] = None,
     success_img_path: Optional[str] = None,
     failure_subject: str = "failure",
-    failure_body: str = "task failure: error_message",
+    failure_body: str = "task failure: {error_message}",
     failure_file_path: Optional[str] = None,
     failure_img_path: Optional[str] = None,
     notify_success: bool = False,
@@ -46,7 +183,7 @@ def run(
     :param success_subject: Email subject for success notifications
     :param success_body: Email body for success notifications
     :param failure_subject: Email subject for failure notifications
-    :param failure_body: Email body for failure notifications, the error message will replace `error_message`
+    :param failure_body: Email body for failure notifications, the error message will replace `{error_message}`
     :param notify_success: Whether to send notification on success
     :param notify_failure: Whether to send notification on failure
     """
@@ -62,7 +199,7 @@ def run(
         try:
             job()
             if notify_success:
-                send_email(
+                queue_email(
                     sender,
                     password,
                     recipients,
@@ -76,11 +213,10 @@ def run(
                 )
         except Exception as e:
             if notify_failure:
-                error_msg = traceback.format_exc()
-                formatted_failure_body = failure_body.replace(
-                    "error_message", error_msg
-                )
-                send_email(
+                # Keep only the innermost frames, where the error was raised
+                error_msg = ''.join(traceback.format_exception(type(e), e, e.__traceback__, limit=-10))
+                formatted_failure_body = format_failure_body(failure_body, error_msg)
+                queue_email(
                     sender,
                     password,
                     recipients,
@@ -95,10 +231,140 @@ def run(
             raise e
 
     setup_schedule(wrapper, schedule_time)
+    run_jobs()
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+
+def format_failure_body(failure_body, error_msg):
+    """
+    Fill the error message into the failure email body.
+
+    The `{error_message}` placeholder is replaced. Bodies without it fall back to replacing
+    the bare word `error_message`, as in earlier versions.
+
+    :param failure_body: Email body for failure notifications
+    :param error_msg: The error message
+    :return: Formatted email body
+    """
+    if "{error_message}" in failure_body:
+        return failure_body.replace("{error_message}", error_msg)
+    return failure_body.replace("error_message", error_msg)
+
+
+def run_jobs():
+    """
+    Run the scheduled jobs until none are left.
+
+    The loop sleeps until the next job is due instead of polling every second, waking at
+    least every MAX_SLEEP seconds so time of day jobs follow the wall clock.
+    """
+    while not (_SCHED.empty() and _WALL_SCHED.empty()):
+        _SCHED.run(blocking=False)
+        _WALL_SCHED.run(blocking=False)
+        # Read the delays only after both ran, a long job on one makes the other's delay stale
+        delays = [delay for delay in (next_delay(_SCHED), next_delay(_WALL_SCHED)) if delay is not None]
+        if delays and min(delays) > 0:
+            time.sleep(min(min(delays), MAX_SLEEP))
+
+
+def next_delay(scheduler):
+    """
+    Get the time until the next event of a scheduler.
+
+    :param scheduler: sched.scheduler
+    :return: Seconds until the next event on the scheduler's clock, None if it has no events
+    """
+    events = scheduler.queue
+    if not events:
+        return None
+    return events[0].time - scheduler.timefunc()
+
+
+def schedule_job(callback, interval=None, at_time=None, weekday=None):
+    """
+    Register a job in the scheduler.
+
+    :param callback: The function to call when the job fires
+    :param interval: Execution interval in seconds
+    :param at_time: Time of day ("HH:MM" or "HH:MM:SS"), used when interval is not given
+    :param weekday: Day of week index (0-6, 0 is Monday) for weekly jobs, None for daily jobs
+    """
+    if interval is None:
+        spec = (None, parse_at_time(at_time), weekday)
+    else:
+        spec = (interval, None, None)
+    fire_time = compute_next_fire(spec)
+    scheduler_for(spec).enterabs(fire_time, 1, fire_job, (spec, callback, fire_time))
+
+
+def fire_job(spec, callback, fire_time):
+    """
+    Run a job and schedule its next fire.
+
+    :param spec: Job spec (interval, at_time, weekday)
+    :param callback: The function to call
+    :param fire_time: Fire time the job runs for
+    """
+    callback()
+    next_fire = compute_next_fire(spec, fire_time)
+    scheduler_for(spec).enterabs(next_fire, 1, fire_job, (spec, callback, next_fire))
+
+
+def scheduler_for(spec):
+    """
+    Get the scheduler whose clock matches the fire times of a job.
+
+    :param spec: Job spec (interval, at_time, weekday)
+    :return: _SCHED for interval jobs, _WALL_SCHED for time of day jobs
+    """
+    return _SCHED if spec[0] is not None else _WALL_SCHED
+
+
+def compute_next_fire(spec, last_fire=None):
+    """
+    Compute the next fire time of a job.
+
+    Interval jobs stay on the fixed grid last_fire + k * interval of time.monotonic(), so
+    late wake-ups neither shift the schedule nor make the job catch up on the ticks it missed.
+    Time of day jobs are computed from the local wall clock as time.time() timestamps, so
+    DST changes, suspend and clock steps don't move them.
+
+    :param spec: Job spec (interval, at_time, weekday)
+    :param last_fire: Fire time the job has just run for, None for a new job
+    :return: Next fire time, a time.monotonic() timestamp for interval jobs and a
+        time.time() timestamp for time of day jobs
+    """
+    interval, at_time, weekday = spec
+    if interval is not None:
+        now = time.monotonic()
+        if last_fire is None:
+            return now + interval
+        missed = max(0, (now - last_fire) // interval)
+        return last_fire + (missed + 1) * interval
+
+    now = datetime.now()
+    hour, minute, second = at_time
+    fire = now.replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if weekday is not None:
+        fire += timedelta(days=(weekday - now.weekday()) % 7)
+    if fire <= now:
+        fire += timedelta(days=1 if weekday is None else 7)
+    return fire.timestamp()
+
+
+def parse_at_time(at_time):
+    """
+    Parse a time of day string.
+
+    :param at_time: Time of day string ("HH:MM" or "HH:MM:SS")
+    :return: (hour, minute, second)
+    """
+    for fmt in ("%H:%M", "%H:%M:%S"):
+        try:
+            parsed = datetime.strptime(at_time, fmt)
+        except (TypeError, ValueError):
+            continue
+        return parsed.hour, parsed.minute, parsed.second
+    raise ValueError(f"Invalid time format: {at_time}")
 
 
 def setup_schedule(job_wrapper, schedule_time):
@@ -108,71 +374,132 @@ def setup_schedule(job_wrapper, schedule_time):
     :param job_wrapper: The wrapped task function
     :param schedule_time: The schedule time
     """
-    if isinstance(schedule_time, (int, float)):
-        # Execute every specified number of seconds
-        schedule.every(schedule_time).seconds.do(job_wrapper)
-    elif isinstance(schedule_time, str):
-        # Execute once at a specific time each day
-        schedule.every().day.at(schedule_time).do(job_wrapper)
-    elif isinstance(schedule_time, list):
-        # Execute at multiple specific times each day
-        for time_point in schedule_time:
-            schedule.every().day.at(time_point).do(job_wrapper)
-    elif isinstance(schedule_time, dict):
-        # Perform complex scheduling based on dictionary key-value pairs
-        for key, value in schedule_time.items():
-            if isinstance(key, int):
-                # Schedule by date
-                setup_date_schedule(job_wrapper, key, value)
-            elif isinstance(key, str):
-                # Schedule by day of the week
-                setup_week_schedule(job_wrapper, key, value)
-            else:
-                raise ValueError(f"Invalid schedule key type: {type(key)}")
-    else:
+    handler = find_handler(_SETUP_HANDLERS, schedule_time)
+    if handler is None:
         raise ValueError("Invalid schedule_time type.")
+    handler(job_wrapper, schedule_time)
+
+
+def find_handler(handlers, value):
+    """
+    Find the handler registered for the type of value.
+
+    The exact type is looked up first; subclasses such as bool fall back to an isinstance scan.
+
+    :param handlers: Handlers keyed by type
+    :param value: The value to dispatch on
+    :return: The handler, or None if no handler matches
+    """
+    handler = handlers.get(type(value))
+    if handler is not None:
+        return handler
+    for cls, handler in handlers.items():
+        if isinstance(value, cls):
+            return handler
+    return None
+
+
+def _sched_interval(job_wrapper, seconds):
+    # Execute every specified number of seconds
+    schedule_job(job_wrapper, interval=seconds)
+
+
+def _sched_daily_at(job_wrapper, time_point):
+    # Execute once at a specific time each day
+    schedule_job(job_wrapper, at_time=time_point)
+
+
+def _sched_list(job_wrapper, time_points):
+    # Execute at multiple specific times each day
+    for time_point in time_points:
+        schedule_job(job_wrapper, at_time=time_point)
+
+
+def _sched_dict(job_wrapper, schedule_dict):
+    # Perform complex scheduling based on dictionary key-value pairs,
+    # an int key is a date and a string key is a day of the week.
+    # Date tasks as {(hour, minute, second): {day: [job_wrapper]}}, see add_date_fire()
+    date_fires = {}
+    for key, value in schedule_dict.items():
+        handler = find_handler(_SCHEDULE_KEY_HANDLERS, key)
+        if handler is None:
+            raise ValueError(f"Invalid schedule key type: {type(key)}")
+        handler(job_wrapper, key, value, date_fires)
 
 
-def setup_date_schedule(job_wrapper, day, value):
+def _week_key(job_wrapper, day_str, value, date_fires):
+    # Weekday keys don't use the date fire table
+    setup_week_schedule(job_wrapper, day_str, value)
+
+
+def setup_date_schedule(job_wrapper, day, value, date_fires=None):
     """
     Schedule tasks by date.
 
     :param job_wrapper: The wrapped task function
     :param day: Date (1-31)
     :param value: Schedule time, can be a number (seconds), a string ("HH:MM"), a list, or other
+    :param date_fires: Date fire table shared by the dates of one schedule, see add_date_fire()
     """
-    if isinstance(value, (int, float)):
-        # On the specified date, execute the task every certain seconds
-        def date_wrapper():
-            today = datetime.now().day
-            if today == day:
-                try:
-                    job_wrapper()
-                except Exception as e:
-                    # Task failure handling is already in the main scheduler
-                    pass
-
-        schedule.every().day.at("00:00").do(date_wrapper).tag(str(day))
-    elif isinstance(value, str):
-        # Execute once at a specific time on the specified date
-        def date_time_wrapper():
-            today = datetime.now().day
-            if today == day:
+    if date_fires is None:
+        date_fires = {}
+    handler = find_handler(_DATE_HANDLERS, value)
+    if handler is None:
+        raise ValueError(f"Invalid schedule value type: {type(value)}")
+    handler(job_wrapper, day, value, date_fires)
+
+
+def _date_interval(job_wrapper, day, seconds, date_fires):
+    # On the specified date, execute the task every certain seconds
+    def date_interval_wrapper():
+        if _now_cached().day == day:
+            try:
                 job_wrapper()
+            except Exception as e:
+                # Task failure handling is already in the main scheduler
+                pass
 
-        schedule.every().day.at(value).do(date_time_wrapper).tag(str(day))
-    elif isinstance(value, list):
-        # Execute at multiple specific times on the specified date
-        for time_point in value:
+    schedule_job(date_interval_wrapper, interval=seconds)
 
-            def date_time_list_wrapper(tp=time_point):
-                today = datetime.now().day
-                if today == day:
-                    job_wrapper()
 
-            schedule.every().day.at(time_point).do(date_time_list_wrapper).tag(str(day))
-    else:
-        raise ValueError(f"Invalid schedule value type: {type(value)}")
+def _date_at(job_wrapper, day, time_point, date_fires):
+    # Execute once at a specific time on the specified date
+    add_date_fire(date_fires, job_wrapper, day, time_point)
+
+
+def _date_list(job_wrapper, day, time_points, date_fires):
+    # Execute at multiple specific times on the specified date
+    for time_point in time_points:
+        add_date_fire(date_fires, job_wrapper, day, time_point)
+
+
+def add_date_fire(date_fires, job_wrapper, day, time_point):
+    """
+    Add a task to a date fire table, registering one dispatcher job per time of day.
+
+    The dispatcher closes over the table, so the table lives exactly as long as its jobs.
+
+    :param date_fires: Date fire table {(hour, minute, second): {day: [job_wrapper]}}
+    :param job_wrapper: The wrapped task function
+    :param day: Date (1-31)
+    :param time_point: Time of day ("HH:MM" or "HH:MM:SS")
+    """
+    at_time = parse_at_time(time_point)
+    if at_time not in date_fires:
+        date_fires[at_time] = {}
+        schedule_job(lambda: dispatch_date(date_fires, at_time), at_time=time_point)
+    date_fires[at_time].setdefault(day, []).append(job_wrapper)
+
+
+def dispatch_date(date_fires, at_time):
+    """
+    Run the tasks registered for today's date at the given time of day.
+
+    :param date_fires: Date fire table {(hour, minute, second): {day: [job_wrapper]}}
+    :param at_time: Time of day (hour, minute, second)
+    """
+    for job_wrapper in date_fires[at_time].get(_now_cached().day, ()):
+        job_wrapper()
 
 
 def setup_week_schedule(job_wrapper, day_str, value):
@@ -187,39 +514,60 @@ def setup_week_schedule(job_wrapper, day_str, value):
     if not day:
         raise ValueError(f"Invalid day of week: {day_str}")
 
-    if isinstance(value, (int, float)):
-        # Execute every specified number of seconds
-        schedule.every().week.do(run_weekly_job, job_wrapper, value).day_of_week = day
-    elif isinstance(value, str):
-        # Execute once at a specific time each week
-        getattr(schedule.every(), day).at(value).do(job_wrapper)
-    elif isinstance(value, list):
-        # Execute at multiple specific times each week
-        for time_point in value:
-            getattr(schedule.every(), day).at(time_point).do(job_wrapper)
-    else:
+    handler = find_handler(_WEEK_HANDLERS, value)
+    if handler is None:
         raise ValueError(f"Invalid schedule value type: {type(value)}")
+    handler(job_wrapper, WEEKDAY_INDEX[day], value)
 
 
-def run_weekly_job(job_wrapper, interval_seconds):
-    """
-    Execute job_wrapper every interval_seconds during the week.
-
-    :param job_wrapper: The wrapped task function
-    :param interval_seconds: Execution interval in seconds
-    """
-    next_run = time.time()
-    while True:
-        current_time = time.time()
-        if current_time >= next_run:
+def _week_interval(job_wrapper, weekday, seconds):
+    # Execute every specified number of seconds on the specified day of the week
+    def weekly_interval_wrapper():
+        if schedule_weekday() == weekday:
             try:
                 job_wrapper()
             except Exception as e:
-                pass  # Error handling is already in the main scheduler
-            next_run = current_time + interval_seconds
-        time.sleep(1)
-        if datetime.now().weekday() != schedule_weekday():
-            break
+                # Task failure handling is already in the main scheduler
+                pass
+
+    schedule_job(weekly_interval_wrapper, interval=seconds)
+
+
+def _week_at(job_wrapper, weekday, time_point):
+    # Execute once at a specific time each week
+    schedule_job(job_wrapper, at_time=time_point, weekday=weekday)
+
+
+def _week_list(job_wrapper, weekday, time_points):
+    # Execute at multiple specific times each week
+    for time_point in time_points:
+        schedule_job(job_wrapper, at_time=time_point, weekday=weekday)
+
+
+# Schedule handlers keyed by the type of the schedule value, see find_handler()
+_SETUP_HANDLERS = {
+    int: _sched_interval,
+    float: _sched_interval,
+    str: _sched_daily_at,
+    list: _sched_list,
+    dict: _sched_dict,
+}
+_SCHEDULE_KEY_HANDLERS = {
+    int: setup_date_schedule,
+    str: _week_key,
+}
+_DATE_HANDLERS = {
+    int: _date_interval,
+    float: _date_interval,
+    str: _date_at,
+    list: _date_list,
+}
+_WEEK_HANDLERS = {
+    int: _week_interval,
+    float: _week_interval,
+    str: _week_at,
+    list: _week_list,
+}
 
 
 def parse_weekday(day_str):
@@ -227,142 +575,226 @@ def parse_weekday(day_str):
     Parse the day of week string.
 
     :param day_str: Day of week string
-    :return: schedule library supported day of week method name (e.g., 'monday') or None
-    """
-    day_str = day_str.strip().lower()
-    days = {
-        "1": "monday",
-        "mon": "monday",
-        "monday": "monday",
-        "星期一": "monday",
-        "周一": "monday",
-        "礼拜一": "monday",
-        "2": "tuesday",
-        "tue": "tuesday",
-        "tuesday": "tuesday",
-        "星期二": "tuesday",
-        "周二": "tuesday",
-        "礼拜二": "tuesday",
-        "3": "wednesday",
-        "wed": "wednesday",
-        "wednesday": "wednesday",
-        "星期三": "wednesday",
-        "周三": "wednesday",
-        "礼拜三": "wednesday",
-        "4": "thursday",
-        "thu": "thursday",
-        "thursday": "thursday",
-        "星期四": "thursday",
-        "周四": "thursday",
-        "礼拜四": "thursday",
-        "5": "friday",
-        "fri": "friday",
-        "friday": "friday",
-        "星期五": "friday",
-        "周五": "friday",
-        "礼拜五": "friday",
-        "6": "saturday",
-        "sat": "saturday",
-        "saturday": "saturday",
-        "星期六": "saturday",
-        "周六": "saturday",
-        "礼拜六": "saturday",
-        "7": "sunday",
-        "sun": "sunday",
-        "sunday": "sunday",
-        "星期日": "sunday",
-        "星期天": "sunday",
-        "周日": "sunday",
-        "周天": "sunday",
-        "礼拜日": "sunday",
-        "礼拜天": "sunday",
-    }
-    return days.get(day_str[:3], None)
+    :return: Day of week name (e.g., 'monday') or None
+    """
+    day_str = day_str.strip().casefold()
+    if not day_str or day_str[0] not in _WEEKDAY_FIRSTCHARS:
+        return None
+    return _WEEKDAY_MAP.get(day_str) or _WEEKDAY_PREFIXES.get(day_str[:3])
 
 
 def schedule_weekday():
     """
     Get the current weekday (0-6, 0 is Monday).
     """
-    return datetime.now().weekday()
+    return _now_cached().weekday()
+
+
+def _now_cached():
+    """
+    Get the current local datetime, computed at most once per second.
+
+    All jobs firing in the same scheduler tick share one datetime.now() call.
+    """
+    t = int(time.time())
+    if _TICK_CACHE["t"] != t:
+        _TICK_CACHE.update(t=t, dt=datetime.now())
+    return _TICK_CACHE["dt"]
+
+
+def _get_smtp(sender, password, smtp_server, smtp_port, smtp_ssl):
+    """
+    Get a logged-in SMTP connection, reusing the cached one while it is still alive.
+
+    The cached connection is reopened after MAX_PER_CONN messages or IDLE_TTL seconds idle.
+
+    :param sender: Sender's email address
+    :param password: Sender's email password
+    :param smtp_server: SMTP server address
+    :param smtp_port: SMTP server port
+    :param smtp_ssl: Use SSL or not
+    :return: Cache entry {server, sent_count, last_used}
+    """
+    key = (sender, smtp_server, smtp_port, smtp_ssl)
+    entry = _SMTP_CACHE.get(key)
+    if entry is not None:
+        now = time.time()
+        if entry["sent_count"] < MAX_PER_CONN and now - entry["last_used"] <= IDLE_TTL:
+            try:
+                if entry["server"].noop()[0] == 250:
+                    entry["last_used"] = now
+                    return entry
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError):
+                pass
+        _close_smtp(key)
+
+    if smtp_ssl:
+        server = smtplib.SMTP_SSL(smtp_server, smtp_port)
+    else:
+        server = smtplib.SMTP(smtp_server, smtp_port)
+        server.starttls()
+    server.login(sender, password)
+    entry = {"server": server, "sent_count": 0, "last_used": time.time()}
+    _SMTP_CACHE[key] = entry
+    return entry
+
+
+def _close_smtp(key):
+    """
+    Remove a connection from the SMTP cache and close it.
+
+    :param key: Cache key (sender, smtp_server, smtp_port, smtp_ssl)
+    """
+    entry = _SMTP_CACHE.pop(key, None)
+    if entry is None:
+        return
+    try:
+        entry["server"].quit()
+    except Exception:
+        pass
+
+
+@atexit.register
+def _close_all_smtp():
+    """
+    Close all cached SMTP connections on process shutdown.
+    """
+    for key in list(_SMTP_CACHE):
+        _close_smtp(key)
+
+
+def queue_email(*args):
+    """
+    Queue an email to be sent by the background SMTP thread.
+
+    The scheduler thread never waits on the SMTP server. The background thread is the
+    only user of the cached SMTP connections, so they need no locking.
+
+    :param args: Positional arguments of send_email
+    """
+    global _SMTP_WORKER
+    with _SMTP_WORKER_LOCK:
+        if _SMTP_WORKER is None:
+            _SMTP_WORKER = threading.Thread(target=_smtp_worker, name="pocwatchdog-smtp", daemon=True)
+            _SMTP_WORKER.start()
+    try:
+        _SMTP_Q.put_nowait(args)
+    except queue.Full:
+        print("Failed to send email: notification queue is full")
+
+
+def _smtp_worker():
+    """
+    Send queued emails until a None sentinel is received.
+
+    Errors are reported per email so one bad email doesn't stop later notifications.
+    """
+    while True:
+        args = _SMTP_Q.get()
+        try:
+            if args is None:
+                break
+            send_email(*args)
+        except Exception as e:
+            # Keep the only worker alive, e.g. when an attachment file is missing
+            print(f"Failed to send email: {str(e)}")
+        finally:
+            _SMTP_Q.task_done()
+
+
+@atexit.register
+def _stop_smtp_worker():
+    """
+    Let the background SMTP thread send the queued emails before the process exits.
+    """
+    if _SMTP_WORKER is None or not _SMTP_WORKER.is_alive():
+        return
+    try:
+        _SMTP_Q.put(None, timeout=SHUTDOWN_TIMEOUT)
+    except queue.Full:
+        return
+    _SMTP_WORKER.join(SHUTDOWN_TIMEOUT)
 
 
 def get_smtp_settings(email):
-    email_providers = {
-        "qq.com": ("smtp.qq.com", 465),
-        "exmail.qq.com": ("smtp.exmail.qq.com", 465),
-        "163.com": ("smtp.163.com", 465),
-        "126.com": ("smtp.126.com", 465),
-        "yeah.net": ("smtp.yeah.net", 465),
-        "sina.com": ("smtp.sina.com", 465),
-        "sina.cn": ("smtp.sina.cn", 465),
-        "sohu.com": ("smtp.sohu.com", 465),
-        "outlook.com": ("smtp.office365.com", 587),
-        "hotmail.com": ("smtp.office365.com", 587),
-        "live.com": ("smtp.office365.com", 587),
-        "gmail.com": ("smtp.gmail.com", 587),
-        "yahoo.com": ("smtp.mail.yahoo.com", 465),
-        "yahoo.com.cn": ("smtp.mail.yahoo.com.cn", 465),
-        "aliyun.com": ("smtp.aliyun.com", 465),
-        "139.com": ("smtp.139.com", 465),
-        "189.cn": ("smtp.189.cn", 465),
-        "21cn.com": ("smtp.21cn.com", 465),
-    }
-
-    domain = email.split("@")[-1].lower()
-    return email_providers.get(domain, ("smtp.exmail.qq.com", 465))
+    return _SMTP_PROVIDERS.get(email.rpartition("@")[2].lower(), ("smtp.exmail.qq.com", 465))
+
+
+def read_image(img_path):
+    """
+    Read an image file, reusing the cached bytes while the file is unchanged.
+
+    :param img_path: Image file path
+    :return: Image bytes
+    """
+    st = os.stat(img_path)
+    key = (st.st_mtime, st.st_size)
+    cached = _IMG_CACHE.get(img_path)
+    if cached is not None and cached[:2] == key:
+        return cached[2]
+    with open(img_path, 'rb') as img_file:
+        data = img_file.read()
+    _IMG_CACHE[img_path] = key + (data,)
+    return data
 
 
 def send_email(sender, password, recipients, smtp_server=None, smtp_port=None, smtp_ssl=True,
                subject=None, body=None, file_paths=None, img_paths=None):
     msg = MIMEMultipart()
-    msg.attach(MIMEText(body or '', 'html', 'utf-8'))
     msg['Subject'] = Header(subject or '', 'utf-8')
     msg['From'] = sender
-    msg['To'] = ', '.join(recipients)
+    # 收件人只通过 RCPT 传递，To 头只显示发件人，避免长收件人列表写进每封邮件
+    msg['To'] = sender
 
     if smtp_server is None or smtp_port is None:
         default_smtp_server, default_smtp_port = get_smtp_settings(sender)
         smtp_server = smtp_server or default_smtp_server
         smtp_port = smtp_port or default_smtp_port
 
+    # 处理正文和图片，图片与正文放在同一个 multipart/related 中
+    html = body or ''
+    if img_paths:
+        if isinstance(img_paths, str):
+            img_paths = [img_paths]
+        related = MIMEMultipart('related')
+        mime_images = ''
+        for i in range(1, len(img_paths) + 1):
+            mime_images += f'<p><img src="cid:imageid{i}" alt="imageid{i}"></p>'
+        html = f'<html><body><p>{html}</p>{mime_images}</body></html>'
+        related.attach(MIMEText(html, 'html', 'utf-8'))
+        for i, img_path in enumerate(img_paths, start=1):
+            mime_img = MIMEImage(read_image(img_path), _subtype='octet-stream')
+            mime_img.add_header('Content-ID', f'<imageid{i}>')
+            related.attach(mime_img)
+        msg.attach(related)
+    else:
+        msg.attach(MIMEText(html, 'html', 'utf-8'))
+
     # 处理文件附件
     if file_paths:
         if isinstance(file_paths, str):
             file_paths = [file_paths]
         for file_path in file_paths:
-            att = MIMEText(open(file_path, 'rb').read(), 'base64', 'utf-8')
-            att['Content-Type'] = 'application/octet-stream'
+            att = MIMEBase('application', 'octet-stream')
+            with open(file_path, 'rb') as f:
+                att.set_payload(f.read())
+            encoders.encode_base64(att)
             file_name = os.path.basename(file_path)
-            if re.search(r'[\u4e00-\u9fff]', file_name):
+            if _CJK_RE.search(file_name):
                 att.add_header('Content-Disposition', 'attachment', filename=('utf-8', '', file_name))
             else:
                 att['Content-Disposition'] = f'attachment; filename="{file_name}"'
             msg.attach(att)
 
-    # 处理图片
-    if img_paths:
-        if isinstance(img_paths, str):
-            img_paths = [img_paths]
-        mime_images = ''
-        for i, img_path in enumerate(img_paths, start=1):
-            mime_images += f'<p><img src="cid:imageid{i}" alt="imageid{i}"></p>'
-            with open(img_path, 'rb') as img_file:
-                mime_img = MIMEImage(img_file.read(), _subtype='octet-stream')
-                mime_img.add_header('Content-ID', f'<imageid{i}>')
-                msg.attach(mime_img)
-        
-        mime_html = MIMEText(f'<html><body><p>{body or ""}</p>{mime_images}</body></html>', 'html', 'utf-8')
-        msg.attach(mime_html)
-
     try:
-        if smtp_ssl:
-            server = smtplib.SMTP_SSL(smtp_server, smtp_port)
-        else:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-        server.login(sender, password)
-        server.sendmail(sender, recipients, msg.as_string())
-        server.quit()
+        entry = _get_smtp(sender, password, smtp_server, smtp_port, smtp_ssl)
+        try:
+            entry["server"].send_message(msg, sender, recipients)
+        except smtplib.SMTPServerDisconnected:
+            # The cached connection dropped after the health check, reconnect once
+            _close_smtp((sender, smtp_server, smtp_port, smtp_ssl))
+            entry = _get_smtp(sender, password, smtp_server, smtp_port, smtp_ssl)
+            entry["server"].send_message(msg, sender, recipients)
+        entry["sent_count"] += 1
     except Exception as e:
         print(f"Failed to send email: {str(e)}")
\ No newline at end of file
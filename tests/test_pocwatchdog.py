@@ -1,7 +1,34 @@
+import builtins
+import os
+import tempfile
+import time
 import unittest
-from src.pocwatchdog.task_scheduler import run
+from datetime import datetime, timedelta
+from unittest import mock
+
+from src.pocwatchdog import task_scheduler
+from src.pocwatchdog.task_scheduler import parse_weekday, run, send_email
+
+class FixedDatetime(datetime):
+    # 2026-10-15 is a Thursday
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2026, 10, 15, 8, 0, 0)
+
+
+def reset_state():
+    for scheduler in (task_scheduler._SCHED, task_scheduler._WALL_SCHED):
+        for event in scheduler.queue:
+            scheduler.cancel(event)
+    task_scheduler._SMTP_CACHE.clear()
+    task_scheduler._IMG_CACHE.clear()
+
 
 class TestPocWatchdog(unittest.TestCase):
+    def setUp(self):
+        reset_state()
+        self.addCleanup(reset_state)
+
     def test_run_without_notifications(self):
         def sample_task():
             return "任务执行成功"
@@ -27,5 +54,214 @@ class TestPocWatchdog(unittest.TestCase):
                 notify_failure=True
             )
 
+    def test_send_email_reuses_smtp_connection(self):
+        with mock.patch("smtplib.SMTP_SSL") as smtp_ssl:
+            server = smtp_ssl.return_value
+            server.noop.return_value = (250, b"OK")
+            for _ in range(3):
+                send_email("sender@qq.com", "password", ["recipient@qq.com"],
+                           subject="subject", body="body")
+            smtp_ssl.assert_called_once_with("smtp.qq.com", 465)
+            server.login.assert_called_once_with("sender@qq.com", "password")
+            self.assertEqual(server.send_message.call_count, 3)
+            msg, from_addr, to_addrs = server.send_message.call_args[0]
+            self.assertEqual(msg["To"], "sender@qq.com")
+            self.assertEqual(to_addrs, ["recipient@qq.com"])
+
+    def test_send_email_reconnects_after_max_per_conn(self):
+        with mock.patch("smtplib.SMTP_SSL") as smtp_ssl, \
+                mock.patch.object(task_scheduler, "MAX_PER_CONN", 2):
+            server = smtp_ssl.return_value
+            server.noop.return_value = (250, b"OK")
+            for _ in range(3):
+                send_email("sender@qq.com", "password", ["recipient@qq.com"],
+                           subject="subject", body="body")
+            self.assertEqual(smtp_ssl.call_count, 2)
+            server.quit.assert_called_once()
+
+    def test_queue_email_sends_in_background(self):
+        with mock.patch("smtplib.SMTP_SSL") as smtp_ssl:
+            task_scheduler.queue_email("sender@qq.com", "password", ["recipient@qq.com"],
+                                       None, None, True, "subject", "body")
+            task_scheduler._SMTP_Q.join()
+            smtp_ssl.return_value.send_message.assert_called_once()
+
+    def test_queue_email_survives_failing_email(self):
+        with mock.patch("smtplib.SMTP_SSL") as smtp_ssl:
+            task_scheduler.queue_email("sender@qq.com", "password", ["recipient@qq.com"],
+                                       None, None, True, "subject", "body", "/nonexistent/file.txt")
+            task_scheduler.queue_email("sender@qq.com", "password", ["recipient@qq.com"],
+                                       None, None, True, "subject", "body")
+            # Bounded wait, a dead worker would make _SMTP_Q.join() hang
+            deadline = time.monotonic() + 5
+            while task_scheduler._SMTP_Q.unfinished_tasks and time.monotonic() < deadline:
+                time.sleep(0.01)
+            smtp_ssl.return_value.send_message.assert_called_once()
+            self.assertTrue(task_scheduler._SMTP_WORKER.is_alive())
+
+    def sent_message(self, **kwargs):
+        with mock.patch("smtplib.SMTP_SSL") as smtp_ssl:
+            send_email("sender@qq.com", "password", ["recipient@qq.com"],
+                       subject="subject", body="body", **kwargs)
+            return smtp_ssl.return_value.send_message.call_args[0][0]
+
+    def test_send_email_mime_structure(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        img_paths = [os.path.join(tmp_dir.name, f"image{i}.png") for i in range(2)]
+        for img_path in img_paths:
+            with open(img_path, "wb") as f:
+                f.write(b"image")
+
+        msg = self.sent_message(img_paths=img_paths)
+        self.assertEqual([part.get_content_type() for part in msg.walk()],
+                         ["multipart/mixed", "multipart/related", "text/html",
+                          "image/octet-stream", "image/octet-stream"])
+
+        msg = self.sent_message()
+        self.assertEqual([part.get_content_type() for part in msg.walk()],
+                         ["multipart/mixed", "text/html"])
+
+    def test_send_email_binary_attachment(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        file_path = os.path.join(tmp_dir.name, "报告.bin")
+        data = bytes(range(256))  # not valid UTF-8
+        with open(file_path, "wb") as f:
+            f.write(data)
+
+        msg = self.sent_message(file_paths=file_path)
+        attachments = [part for part in msg.walk() if part.get_filename()]
+        self.assertEqual([part.get_filename() for part in attachments], ["报告.bin"])
+        self.assertEqual(attachments[0].get_payload(decode=True), data)
+
+    def test_read_image_cache(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        img_path = os.path.join(tmp_dir.name, "image.png")
+        with open(img_path, "wb") as f:
+            f.write(b"image-1")
+
+        with mock.patch("smtplib.SMTP_SSL"), mock.patch("builtins.open", wraps=builtins.open) as open_mock:
+            for _ in range(2):
+                send_email("sender@qq.com", "password", ["recipient@qq.com"],
+                           subject="subject", body="body", img_paths=img_path)
+        # The second send reuses the cached bytes
+        self.assertEqual(open_mock.call_count, 1)
+
+        # A size change causes a re-read
+        with open(img_path, "wb") as f:
+            f.write(b"image-22")
+        self.assertEqual(task_scheduler.read_image(img_path), b"image-22")
+
+        # An mtime change with the same size causes a re-read
+        with open(img_path, "wb") as f:
+            f.write(b"image-33")
+        st = os.stat(img_path)
+        os.utime(img_path, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(task_scheduler.read_image(img_path), b"image-33")
+
+    def test_setup_schedule_registers_jobs(self):
+        task_scheduler.setup_schedule(lambda: None, {1: ["08:00", "12:00"], 2: "08:00", "mon": "08:00:30", "fri": 60})
+        # Dates sharing a time of day share one dispatcher job
+        self.assertEqual(len(task_scheduler._SCHED.queue), 1)
+        self.assertEqual(len(task_scheduler._WALL_SCHED.queue), 3)
+        with self.assertRaises(ValueError):
+            task_scheduler.setup_schedule(lambda: None, "25:00")
+
+    def test_get_smtp_settings(self):
+        self.assertEqual(task_scheduler.get_smtp_settings("user@Gmail.com"), ("smtp.gmail.com", 587))
+        self.assertEqual(task_scheduler.get_smtp_settings("user@example.com"), ("smtp.exmail.qq.com", 465))
+
+    def test_format_failure_body(self):
+        self.assertEqual(task_scheduler.format_failure_body("failed, error_message: {error_message}", "boom"),
+                         "failed, error_message: boom")
+        self.assertEqual(task_scheduler.format_failure_body("failed: error_message", "boom"), "failed: boom")
+
+    def test_dispatch_date_runs_todays_jobs(self):
+        date_fires = {}
+        today_job, other_day_job = mock.Mock(), mock.Mock()
+        task_scheduler.setup_date_schedule(today_job, 15, "08:00", date_fires)
+        task_scheduler.setup_date_schedule(other_day_job, 16, ["08:00", "12:00"], date_fires)
+        self.assertEqual(sorted(date_fires[(8, 0, 0)]), [15, 16])
+        with mock.patch.object(task_scheduler, "_now_cached", FixedDatetime.now):
+            task_scheduler.dispatch_date(date_fires, (8, 0, 0))
+        today_job.assert_called_once()
+        other_day_job.assert_not_called()
+
+    def test_run_again_after_failing_date_job(self):
+        fire = datetime.now() + timedelta(seconds=1)
+        schedule_time = {fire.day: fire.strftime("%H:%M:%S")}
+
+        def failing_task():
+            raise RuntimeError("date job failed")
+
+        with self.assertRaises(RuntimeError):
+            run(job=failing_task, schedule_time=schedule_time)
+        # The second run must schedule the date job again instead of returning at once
+        with mock.patch("time.sleep", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                run(job=failing_task, schedule_time=schedule_time)
+        self.assertEqual(len(task_scheduler._WALL_SCHED.queue), 1)
+
+    def test_compute_next_fire_interval_grid(self):
+        spec = (10, None, None)
+        with mock.patch("time.monotonic", return_value=100.0):
+            self.assertEqual(task_scheduler.compute_next_fire(spec), 110.0)
+            # On time and slightly late wake-ups keep the fixed grid
+            self.assertEqual(task_scheduler.compute_next_fire(spec, 100.0), 110.0)
+            self.assertEqual(task_scheduler.compute_next_fire(spec, 97.0), 107.0)
+            # Ticks missed while the job ran late are skipped, not caught up
+            self.assertEqual(task_scheduler.compute_next_fire(spec, 65.0), 105.0)
+
+    def test_compute_next_fire_time_of_day(self):
+        with mock.patch.object(task_scheduler, "datetime", FixedDatetime):
+            # A daily job due right now runs again tomorrow
+            self.assertEqual(task_scheduler.compute_next_fire((None, (8, 0, 0), None), 0.0),
+                             datetime(2026, 10, 16, 8, 0).timestamp())
+            self.assertEqual(task_scheduler.compute_next_fire((None, (9, 30, 0), None)),
+                             datetime(2026, 10, 15, 9, 30).timestamp())
+            self.assertEqual(task_scheduler.compute_next_fire((None, (8, 0, 0), 0)),
+                             datetime(2026, 10, 19, 8, 0).timestamp())
+            self.assertEqual(task_scheduler.compute_next_fire((None, (8, 0, 0), 3)),
+                             datetime(2026, 10, 22, 8, 0).timestamp())
+
+    def test_fire_job_reschedules(self):
+        callback = mock.Mock()
+        with mock.patch("time.monotonic", return_value=100.0):
+            task_scheduler.fire_job((10, None, None), callback, 100.0)
+        self.assertEqual([event.time for event in task_scheduler._SCHED.queue], [110.0])
+        with mock.patch.object(task_scheduler, "datetime", FixedDatetime):
+            task_scheduler.fire_job((None, (8, 0, 0), None), callback, datetime(2026, 10, 15, 8, 0).timestamp())
+        # A daily job goes back on the wall clock scheduler for the same time tomorrow
+        self.assertEqual([event.time for event in task_scheduler._WALL_SCHED.queue],
+                         [datetime(2026, 10, 16, 8, 0).timestamp()])
+        self.assertEqual(callback.call_count, 2)
+
+    def test_run_jobs_rereads_delay_after_long_wall_job(self):
+        clock = [100.0]
+        interval_job = mock.Mock()
+
+        def long_wall_job():
+            # The interval job below becomes overdue while this job runs
+            clock[0] = 130.0
+
+        task_scheduler._SCHED.enterabs(110.0, 1, interval_job)
+        task_scheduler._WALL_SCHED.enterabs(time.time() - 1, 1, long_wall_job)
+        with mock.patch.object(task_scheduler._SCHED, "timefunc", lambda: clock[0]), \
+                mock.patch("time.sleep") as sleep:
+            task_scheduler.run_jobs()
+        interval_job.assert_called_once()
+        sleep.assert_not_called()
+
+    def test_parse_weekday(self):
+        for day_str in ["1", "mon", "Monday", "MONDAY", "mon.", "星期一", "周一", "礼拜一"]:
+            self.assertEqual(parse_weekday(day_str), "monday")
+        self.assertEqual(parse_weekday(" Tues "), "tuesday")
+        self.assertEqual(parse_weekday("星期天"), "sunday")
+        self.assertIsNone(parse_weekday("8"))
+        self.assertIsNone(parse_weekday("holiday"))
+        self.assertIsNone(parse_weekday(""))
+
 if __name__ == '__main__':
     unittest.main()